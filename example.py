@@ -27,12 +27,20 @@ if __name__ == "__main__":
 	min_trembling_frequency = 7
 	mlf_max_error_ratio = 0.1
 	avg_keys_per_second = 0
+	smoothing_alpha = 0
+	one_euro_min_cutoff = 0
+	one_euro_beta = 0.007
+	openpose_params = {}  # Additional OpenPose flags, such as {"net_resolution": "-1x256"}
+	use_cache = True
+	use_visvalingam = False
 
 	# Creation
 	v2a = Video2Anim(video_path=video_path, output_folder=output_folder, openpose_path=openpose_path,
 	                 bones_defs=bones_defs, body_orientation=body_orientation,
 	                 min_confidence=min_confidence, min_trembling_freq=min_trembling_frequency,
-	                 mlf_max_error_ratio=mlf_max_error_ratio, avg_keys_per_sec=avg_keys_per_second)
+	                 mlf_max_error_ratio=mlf_max_error_ratio, avg_keys_per_sec=avg_keys_per_second,
+	                 smoothing_alpha=smoothing_alpha, one_euro_min_cutoff=one_euro_min_cutoff, one_euro_beta=one_euro_beta,
+	                 openpose_params=openpose_params, use_cache=use_cache, use_visvalingam=use_visvalingam)
 
 	# Execution
 	v2a.run()
\ No newline at end of file
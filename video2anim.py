@@ -12,14 +12,25 @@ More information can be found in the README.md or the specific methods docstring
 
 import os
 import subprocess
-from json import load as json_load
-from math import atan2, degrees
+import hashlib
+import shutil
+import tempfile
+try:
+	from orjson import loads as json_loads  # Optional, faster parsing of the OpenPose's .json files
+except ImportError:
+	from json import loads as json_loads
 from string import Template
-from cv2 import VideoCapture, CAP_PROP_FPS
+from cv2 import VideoCapture, CAP_PROP_FPS, imwrite, IMWRITE_PNG_COMPRESSION
 import numpy as np
-from bisect import bisect
-import time
 import heapq
+import math
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from collections import deque
+from contextlib import closing
+from threading import Thread, Event
+from queue import Queue, Full
+import time
 
 
 class Video2Anim:
@@ -42,8 +53,23 @@ class Video2Anim:
 	DEFAULT_MIN_TREMBLING_FREQ = 7
 	DEFAULT_MLF_MAX_ERROR_RATIO = 0.1
 	DEFAULT_AVG_KEYS_PER_SEC = 0
+	DEFAULT_SMOOTHING_ALPHA = 0
+	DEFAULT_ONE_EURO_MIN_CUTOFF = 0
+	DEFAULT_ONE_EURO_BETA = 0.007
+	ONE_EURO_DERIVATIVE_CUTOFF = 1
+	DEFAULT_NUM_PROCESSES = 1
 	OPENPOSE_RELATIVE_EXE_PATH = os.path.normpath("bin/OpenPoseDemo.exe")
+	OPENPOSE_POLL_INTERVAL = 0.1
+	POSES_PREFETCH_SIZE = 64
+	POSES_PREFETCH_TIMEOUT = 0.1
+	POSES_PARSE_CHUNK_SIZE = 64
+	ANIM_FILE_BUFFER_SIZE = 1 << 20
 	NUM_BONE_DEF_VALUES = 4
+	NUM_BODY_KEYPOINTS = 25
+	KEYPOINTS_BUFFER_INITIAL_FRAMES = 1024
+	BONE_IDXS_INI = slice(0, 2)
+	BONE_IDXS_END = slice(2, 4)
+	BONE_IDXS_PARENT = 4
 
 	ANIM_FILE_TEMPLATE = '''%YAML 1.1
 %TAG !u! tag:unity3d.com,2011:
@@ -146,6 +172,15 @@ $CURVE      m_PreInfinity: 2
         outWeight: 0.5
 '''
 
+	# Templates compiled once. The keys templates are converted to positional %-format strings, which are much faster
+	# to fill than a Template or a mapping. They are filled with the tuple (time, value, slope, slope)
+	ANIM_FILE_TMPL = Template(ANIM_FILE_TEMPLATE)
+	EULER_CURVE_TMPL = Template(EULER_CURVE_TEMPLATE)
+	EULER_CURVE_KEY_FORMAT = Template(EULER_CURVE_KEY_TEMPLATE).substitute(
+		TIME='%s', VALUE='{x: 0, y: 0, z: %s}', SLOPE='{x: 0, y: 0, z: %s}')
+	EDITOR_CURVE_TMPL = Template(EDITOR_CURVE_TEMPLATE)
+	EDITOR_CURVE_KEY_FORMAT = Template(EDITOR_CURVE_KEY_TEMPLATE).substitute(TIME='%s', VALUE='%s', SLOPE='%s')
+
 	###################### For external use ######################
 	def __init__(self, **kwargs):
 		"""
@@ -166,12 +201,20 @@ $CURVE      m_PreInfinity: 2
 		self.anim_folder = None
 		self.openpose_path = None
 		self.bones_defs = None
+		self.bones_idxs = None
 		self.body_orientation = self.DEFAULT_BODY_ORIENTATION
 		self.min_confidence = self.DEFAULT_MIN_CONFIDENCE
 		self.min_trembling_freq = self.DEFAULT_MIN_TREMBLING_FREQ
 		self.max_trembling_period = 1 / self.DEFAULT_MIN_TREMBLING_FREQ if self.DEFAULT_MIN_TREMBLING_FREQ > 0 else 0
 		self.mlf_max_error_ratio = self.DEFAULT_MLF_MAX_ERROR_RATIO
 		self.avg_keys_per_sec = self.DEFAULT_AVG_KEYS_PER_SEC
+		self.smoothing_alpha = self.DEFAULT_SMOOTHING_ALPHA
+		self.one_euro_min_cutoff = self.DEFAULT_ONE_EURO_MIN_CUTOFF
+		self.one_euro_beta = self.DEFAULT_ONE_EURO_BETA
+		self.openpose_params = {}
+		self.num_processes = self.DEFAULT_NUM_PROCESSES
+		self.use_cache = True
+		self.use_visvalingam = False
 
 		# Set the settings of the arguments
 		self.set_settings(**kwargs)
@@ -208,6 +251,29 @@ $CURVE      m_PreInfinity: 2
 			If a bone has more keys during a second, the amount will be reduced computing averages.
 			This is an alternative to trembling reduction and MLF, it is not recommended to use it at the same time.
 			By default has a value of 0, which disables the process.
+		:keyword smoothing_alpha: Weight of the previous angle when smoothing the angles. In range [0, 1).
+			Every angle is replaced by the interpolation between it and the previous smoothed angle.
+			See the README.md for more information.
+			By default has a value of 0, which disables the process.
+		:keyword one_euro_min_cutoff: Minimum cutoff frequency of the One Euro filter, which reduces the trembling adapting
+			its smoothing to the speed of the movement. It is an alternative to the trembling reduction, which is skipped when the filter is used.
+			See the README.md for more information.
+			By default has a value of 0, which disables the process.
+		:keyword one_euro_beta: Speed coefficient of the One Euro filter. The higher it is, the less delayed the fast movements will be.
+			By default has a value of 0.007.
+		:keyword openpose_params: Dictionary of additional OpenPose flags and its values, such as {"net_resolution": "-1x256", "num_gpu": 1}.
+			They are added to the OpenPose command, so can be used to tune its performance.
+			By default, OpenPose doesn't render nor display the frames, use {"display": -1, "render_pose": 1} to see them.
+			The model_pose flag can only be BODY_25, because the poses are read in that format.
+			By default is empty.
+		:keyword num_processes: Number of processes used to read the OpenPose's .json files and to process the bones in parallel.
+			The .json files are only read in parallel if OpenPose has already finished, otherwise they are read while it is running.
+			By default has a value of 1, which disables parallelism. A value of 0 uses one process per CPU core.
+			Parallelism requires to call the run method inside an if __name__ == "__main__": block.
+		:keyword use_cache: If the keypoints read from the OpenPose's .json files are stored in a .npz file,
+			to avoid reading them again in the next executions with the same video and person. By default is True.
+		:keyword use_visvalingam: If the Visvalingam-Whyatt algorithm is used instead of Multi-Line Fitting to simplify the animation,
+			with the same maximum error (mlf_max_error_ratio). See the README.md for more information. By default is False.
 
 		:raises AssertionError: If any setting is incorrect.
 		"""
@@ -223,6 +289,13 @@ $CURVE      m_PreInfinity: 2
 			min_trembling_freq = kwargs.get("min_trembling_freq", None)
 			mlf_max_error_ratio = kwargs.get("mlf_max_error_ratio", None)
 			avg_keys_per_sec = kwargs.get("avg_keys_per_sec", None)
+			smoothing_alpha = kwargs.get("smoothing_alpha", None)
+			one_euro_min_cutoff = kwargs.get("one_euro_min_cutoff", None)
+			one_euro_beta = kwargs.get("one_euro_beta", None)
+			openpose_params = kwargs.get("openpose_params", None)
+			num_processes = kwargs.get("num_processes", None)
+			use_cache = kwargs.get("use_cache", None)
+			use_visvalingam = kwargs.get("use_visvalingam", None)
 
 			# Input video
 			if video_path is not None:
@@ -244,7 +317,10 @@ $CURVE      m_PreInfinity: 2
 			if output_folder is not None:
 				self.output_folder = os.path.normpath(output_folder)
 				os.makedirs(os.path.dirname(self.output_folder), exist_ok=True)
-			
+
+			# The subfolders depend on the video, so they change with any of both settings
+			if (output_folder is not None or video_path is not None) and \
+					self.output_folder is not None and self.video_name is not None:
 				self.poses_folder = os.path.join(self.output_folder, self.video_name, "Poses")
 				os.makedirs(os.path.dirname(self.poses_folder), exist_ok=True)
 
@@ -267,6 +343,7 @@ $CURVE      m_PreInfinity: 2
 			if bones_defs is not None:
 				bones_defs = self.check_and_sort_bones_defs(bones_defs)
 				self.bones_defs = bones_defs
+				self.bones_idxs = self.get_bones_idxs(bones_defs)
 
 			if body_orientation is not None:
 				self.body_orientation = body_orientation % 360
@@ -283,7 +360,7 @@ $CURVE      m_PreInfinity: 2
 				self.max_trembling_period = 1 / min_trembling_freq if min_trembling_freq > 0 else 0
 
 			if mlf_max_error_ratio is not None:
-				if mlf_max_error_ratio < 0 or min_confidence > 1:
+				if mlf_max_error_ratio < 0 or mlf_max_error_ratio > 1:
 					raise AssertionError("mlf_max_error_ratio must be in the range [0, 1]")
 				self.mlf_max_error_ratio = mlf_max_error_ratio
 
@@ -292,6 +369,39 @@ $CURVE      m_PreInfinity: 2
 					raise AssertionError("avg_keys_per_sec must be greater than or equal to 0")
 				self.avg_keys_per_sec = avg_keys_per_sec
 
+			if smoothing_alpha is not None:
+				if smoothing_alpha < 0 or smoothing_alpha >= 1:
+					raise AssertionError("smoothing_alpha must be in the range [0, 1)")
+				self.smoothing_alpha = smoothing_alpha
+
+			if one_euro_min_cutoff is not None:
+				if one_euro_min_cutoff < 0:
+					raise AssertionError("one_euro_min_cutoff must be greater than or equal to 0")
+				self.one_euro_min_cutoff = one_euro_min_cutoff
+
+			if one_euro_beta is not None:
+				if one_euro_beta < 0:
+					raise AssertionError("one_euro_beta must be greater than or equal to 0")
+				self.one_euro_beta = one_euro_beta
+
+			if openpose_params is not None:
+				if not isinstance(openpose_params, dict):
+					raise AssertionError("openpose_params must be a dictionary")
+				if str(openpose_params.get("model_pose", "BODY_25")) != "BODY_25":
+					raise AssertionError("openpose_params model_pose must be BODY_25, the keypoints format used by bones_defs")
+				self.openpose_params = openpose_params
+
+			if num_processes is not None:
+				if num_processes < 0:
+					raise AssertionError("num_processes must be greater than or equal to 0")
+				self.num_processes = num_processes
+
+			if use_cache is not None:
+				self.use_cache = use_cache
+
+			if use_visvalingam is not None:
+				self.use_visvalingam = use_visvalingam
+
 	def run(self, person_idx=0, **kwargs):
 		"""
 		Executes the video to animation translation following the next steps:
@@ -300,6 +410,7 @@ $CURVE      m_PreInfinity: 2
 		3. Execute OpenPose with the video selected if output_folder contains no previous results,
 			putting the resulting .json files in output_folder/<video name>/Poses.
 		4. Read the poses of the specified person_idx from the .json files.
+			If OpenPose is running, the files are read as soon as they are written.
 		5. Process the poses to get a smooth animation.
 		6. Write the results in an .anim file in output_folder/<video name>/Animations, using as name the name of the video concatenated with the person index.
 
@@ -315,11 +426,21 @@ $CURVE      m_PreInfinity: 2
 		self.check_if_can_run()
 
 		# Detect poses
+		openpose_process = None
 		if not os.path.exists(self.poses_folder):
-			self.detect_poses(self.video_path, self.poses_folder)
+			openpose_process = self.detect_poses(self.video_path, self.poses_folder)
 
-		# Read poses and process animation
-		bones_values, duration = self.read_poses(self.poses_folder, self.bones_defs, person_idx)
+		# Read poses (while OpenPose is running, if it is) and process animation
+		try:
+			bones_values, duration = self.read_poses(self.poses_folder, self.bones_idxs, person_idx, openpose_process)
+		except BaseException:
+			# If OpenPose hasn't finished successfully its results are incomplete, so they are removed to not be reused
+			if openpose_process is not None:
+				if openpose_process.poll() is None:
+					openpose_process.kill()
+				if openpose_process.wait() != 0:
+					shutil.rmtree(self.poses_folder, ignore_errors=True)
+			raise
 		bones_values = self.process_animation(bones_values)
 
 		# Write animation
@@ -329,6 +450,57 @@ $CURVE      m_PreInfinity: 2
 
 		return bones_values
 
+	def run_batch(self, videos_paths, person_idx=0, **kwargs):
+		"""
+		Executes the run method with every video of videos_paths, using the same settings.
+		OpenPose is executed only once for all the videos without previous results, so its initialization
+		(loading the models) is done one time instead of once per video. See detect_poses_batch for more information.
+
+		:param videos_paths: List of paths to the video files.
+		:param person_idx: Index of the person to create the animations. By default is 0, the first person.
+		:param kwargs: Settings to assign before execution, except video_path. Can be None.
+			All the available settings are described in the set_setting method docstring.
+
+		:raises AssertionError: If any setting is incorrect, the required parameters are not defined
+			or two different videos have the same name (their results would be placed in the same folder).
+
+		:return: List with the bones values of every video, as returned by the run method.
+		"""
+		self.set_settings(**kwargs)
+
+		# Find the videos without previous results
+		# A video listed more than once is only detected one time
+		pending_videos_paths = []
+		pending_poses_folders = []
+		folders_videos_paths = {}
+		for video_path in videos_paths:
+			self.set_settings(video_path=video_path)
+			self.check_if_can_run()
+			poses_folder = os.path.normcase(os.path.abspath(self.poses_folder))
+			abs_video_path = os.path.normcase(os.path.abspath(video_path))
+			if poses_folder in folders_videos_paths:
+				if folders_videos_paths[poses_folder] != abs_video_path:
+					raise AssertionError(f"videos {folders_videos_paths[poses_folder]} and {abs_video_path} have the same name, "
+					                     f"so their results would be placed in the same folder {self.poses_folder}")
+				continue
+			folders_videos_paths[poses_folder] = abs_video_path
+			if not os.path.exists(self.poses_folder):
+				pending_videos_paths.append(video_path)
+				pending_poses_folders.append(self.poses_folder)
+
+		# With a single video, run executes OpenPose reading its results at the same time
+		if len(pending_videos_paths) > 1:
+			self.detect_poses_batch(pending_videos_paths, pending_poses_folders)
+
+			# The keypoints cached from previous poses of these videos are outdated, so they are removed
+			for poses_folder in pending_poses_folders:
+				with os.scandir(os.path.dirname(poses_folder)) as entries:
+					for entry in entries:
+						if entry.name.startswith("Keypoints_") and entry.name.endswith(".npz"):
+							os.remove(entry.path)
+
+		return [self.run(person_idx, video_path=video_path) for video_path in videos_paths]
+
 	###################### Error checking ######################
 	def check_and_sort_bones_defs(self, bones_defs):
 		"""
@@ -343,53 +515,54 @@ $CURVE      m_PreInfinity: 2
 		"""
 		if not isinstance(bones_defs, list) or len(bones_defs) == 0:
 			raise AssertionError("bones_defs must be a not-empty list, one element per bone")
-		else:
-			idx = 0
-			num_bones = len(bones_defs)
-			is_sorted = True
-			while idx < num_bones:
-				bone_def = bones_defs[idx]
-				if len(bone_def) < self.NUM_BONE_DEF_VALUES:
-					raise AssertionError(
-						f"Bone in position {idx} of bones_defs has less than {self.NUM_BONE_DEF_VALUES} values\n {bone_def}")
-				parent_idx = bone_def[2]
-				if parent_idx == idx:
-					raise AssertionError(
-						f"Bone in position {idx} of bones_defs has himself as parent \n {self.bones_defs}")
-				# If the bone_def is positioned before its parent, solve the problem
-				elif parent_idx >= 0 and idx < parent_idx:
-					if is_sorted:
-						is_sorted = False
-						bones_defs = bones_defs.copy()  # Copy the list before sort, to avoid modification of the original
-
-					# Move the bone_def to a correct position
-					new_bone_idx = parent_idx
-					self.bones_defs.insert(new_bone_idx, self.bones_defs.pop(idx))
-					bone_def[2] -= 1  # Now the parent is just before
-
-					# Update affected parents indexes of bones_defs
-					upd_idx = idx
-					while upd_idx < num_bones:
-						if upd_idx != new_bone_idx:
-							upd_bone = self.bones_defs[upd_idx]
-							upd_parent_idx = upd_bone[2]
-							# If the parent index is between the movement positions, needs to be changed
-							if idx <= upd_parent_idx <= new_bone_idx:
-								# If it's a child of the moved
-								if upd_parent_idx == idx:
-									upd_parent_idx = new_bone_idx
-								# If the parent is before the moved
-								else:
-									upd_parent_idx -= 1
-
-								upd_bone[2] = upd_parent_idx
-
-						upd_idx += 1
-
-					idx -= 1  # Compensate the movement
-				idx += 1
-
-		return bones_defs
+
+		num_bones = len(bones_defs)
+		children = [[] for _ in range(num_bones)]
+		roots = deque()
+		is_sorted = True
+		for idx, bone_def in enumerate(bones_defs):
+			if len(bone_def) < self.NUM_BONE_DEF_VALUES:
+				raise AssertionError(
+					f"Bone in position {idx} of bones_defs has less than {self.NUM_BONE_DEF_VALUES} values\n {bone_def}")
+			parent_idx = bone_def[2]
+			if parent_idx == idx:
+				raise AssertionError(
+					f"Bone in position {idx} of bones_defs has himself as parent \n {bone_def}")
+			elif parent_idx >= num_bones or parent_idx < -1:
+				raise AssertionError(
+					f"Bone in position {idx} of bones_defs has a parent out of the list \n {bone_def}")
+			elif parent_idx == -1:
+				roots.append(idx)
+			else:
+				children[parent_idx].append(idx)
+				# If the bone_def is positioned before its parent, the list needs to be sorted
+				is_sorted = is_sorted and parent_idx < idx
+
+		if is_sorted:
+			return bones_defs
+
+		# Sort topologically (Kahn's algorithm), so every parent is placed before its children
+		sorted_idxs = []
+		while len(roots):
+			idx = roots.popleft()
+			sorted_idxs.append(idx)
+			roots.extend(children[idx])
+		if len(sorted_idxs) < num_bones:
+			raise AssertionError(f"bones_defs has a cycle of parents, so it can't be sorted \n {bones_defs}")
+
+		# Copy the bones definitions with the parents indices updated, to avoid modification of the original
+		new_idxs = [0] * num_bones
+		for new_idx, idx in enumerate(sorted_idxs):
+			new_idxs[idx] = new_idx
+
+		sorted_bones_defs = []
+		for idx in sorted_idxs:
+			bone_def = list(bones_defs[idx])
+			if bone_def[2] != -1:
+				bone_def[2] = new_idxs[bone_def[2]]
+			sorted_bones_defs.append(bone_def)
+
+		return sorted_bones_defs
 
 	def check_if_can_run(self):
 		"""Checks if all the required parameters are defined.
@@ -408,274 +581,540 @@ $CURVE      m_PreInfinity: 2
 			raise AssertionError("bones_defs" + message)
 
 	###################### Detect poses (use OpenPose) ######################
-	def detect_poses(self, in_path, out_path):
-		"""Executes OpenPose with a video to obtain the poses data.
-		The working directory will be moved to openpose_path during the process.
+	def detect_poses(self, in_path, out_path, is_images_folder=False):
+		"""Starts OpenPose with a video to obtain the poses data.
+		OpenPose runs in a separate process, so its results can be read while it is processing the video.
 
 		:param in_path: Path of the video
 		:param out_path: Path where OpenPose will output the .json result files
+		:param is_images_folder: If in_path is a folder of images instead of a video. By default is False.
 
-		:raises Exception: If any problem happens during the execution of OpenPose.
+		:raises Exception: If OpenPose can't be started.
+
+		:return: The OpenPose process.
 		"""
-		current_path = os.getcwd()
 		try:
-			os.chdir(self.openpose_path)
-			self.exe_openpose(in_path, out_path)
+			return self.exe_openpose(in_path, out_path, is_images_folder)
 		except Exception as exc:
 			raise Exception(f"Problem executing OpenPose: {exc}", exc)
-		finally:
-			os.chdir(current_path)
 
-	def exe_openpose(self, in_path, out_path):
-		"""Executes OpenPose as a command, using subprocess.run method.
+	def detect_poses_batch(self, in_paths, out_paths):
+		"""Executes OpenPose once with multiple videos to obtain their poses data.
+		The frames of all the videos are extracted as images to a temporary folder, which OpenPose processes as a whole.
+		Then, the .json result files of every video are moved to its out_path, with the same names as if the video was processed alone.
+
+		:param in_paths: Paths of the videos
+		:param out_paths: Paths where the .json result files of every video will be placed
+
+		:raises Exception: If OpenPose can't be executed or finishes with an error.
+		"""
+		with tempfile.TemporaryDirectory() as temp_folder:
+			images_folder = os.path.join(temp_folder, "Images")
+			poses_folder = os.path.join(temp_folder, "Poses")
+			os.makedirs(images_folder)
+
+			# The images are named with the video and frame indices, so OpenPose names its results in the same way
+			for video_idx, in_path in enumerate(in_paths):
+				video = VideoCapture(in_path)
+				frame_idx = 0
+				has_frame, frame = video.read()
+				while has_frame:
+					# A low compression is enough for temporary images, and much faster
+					imwrite(os.path.join(images_folder, f"{video_idx}_{frame_idx:012d}.png"), frame, [IMWRITE_PNG_COMPRESSION, 1])
+					frame_idx += 1
+					has_frame, frame = video.read()
+				video.release()
+
+			openpose_process = self.detect_poses(images_folder, poses_folder, is_images_folder=True)
+			if openpose_process.wait() != 0:
+				raise Exception(f"Problem executing OpenPose: exit code {openpose_process.returncode}")
+
+			# Move the results to an incomplete folder next to the folder of each video, which is renamed when all are moved
+			# So if it fails, no out_path is left with only some of its results (that would be taken as complete)
+			videos_names = [os.path.splitext(os.path.basename(in_path))[0] for in_path in in_paths]
+			incomplete_paths = [f"{os.path.normpath(out_path)}.incomplete" for out_path in out_paths]
+			try:
+				for incomplete_path in incomplete_paths:
+					shutil.rmtree(incomplete_path, ignore_errors=True)
+					os.makedirs(incomplete_path)
+				for file_name in os.listdir(poses_folder):
+					video_idx, frame_name = file_name.split("_", 1)
+					video_idx = int(video_idx)
+					shutil.move(os.path.join(poses_folder, file_name),
+					            os.path.join(incomplete_paths[video_idx], f"{videos_names[video_idx]}_{frame_name}"))
+				for incomplete_path, out_path in zip(incomplete_paths, out_paths):
+					os.replace(incomplete_path, out_path)
+			finally:
+				for incomplete_path in incomplete_paths:
+					shutil.rmtree(incomplete_path, ignore_errors=True)
+
+	def exe_openpose(self, in_path, out_path, is_images_folder=False):
+		"""Starts OpenPose as a command, using subprocess.Popen with openpose_path as working directory.
+		The arguments are passed directly, without a shell, so the paths can contain spaces.
 		:param in_path: Path of the video
 		:param out_path: Path where OpenPose will output the .json result files
+		:param is_images_folder: If in_path is a folder of images instead of a video. By default is False.
+		:return: The OpenPose process.
 		"""
-		command = f"{self.OPENPOSE_RELATIVE_EXE_PATH} --keypoint_scale 3 --video {in_path} --write_json {out_path} --output_resolution 640x360"
-		subprocess.run(command, shell=True, check=True)
+		exe_path = os.path.join(os.path.abspath(self.openpose_path), self.OPENPOSE_RELATIVE_EXE_PATH)
+		in_path = os.path.abspath(in_path)
+		out_path = os.path.abspath(out_path)
+		in_flag = "--image_dir" if is_images_folder else "--video"
+		# Only the keypoints are needed, so skip rendering and displaying the frames
+		command = [exe_path, "--keypoint_scale", "3", in_flag, in_path, "--write_json", out_path,
+		           "--display", "0", "--render_pose", "0"]
+		for flag, value in self.openpose_params.items():
+			command += [f"--{flag}", str(value)]
+		return subprocess.Popen(command, cwd=self.openpose_path)
 
 	###################### Read poses files ######################
-	def read_poses(self, poses_folder, bones_defs, person_idx=0):
+	def read_poses(self, poses_folder, bones_idxs, person_idx=0, openpose_process=None):
 		"""
 		Reads and stores the poses from the .json files outputted by OpenPose.
 
 		:param poses_folder: Folder which contains the .json files.
-		:param bones_defs: Bones definitions to use.
+		:param bones_idxs: Indices of the bones definitions to use, obtained with get_bones_idxs.
 		:param person_idx: Index of the person to create the animation. By default is 0, the first person.
-		:return: A list of lists where every position belongs to a bone.
-			Each bone has a list where every element is a keypoint (pair of timestamp and angle).
+		:param openpose_process: OpenPose process which is writing the .json files. By default is None, all the files are already written.
+		:return: A list where every position belongs to a bone and the duration of the animation.
+			Each bone has an array of shape (keys, 2) where every row is a keypoint (pair of timestamp and angle).
 		"""
+		keypoints = self.read_keypoints(poses_folder, person_idx, openpose_process)
+		return self.get_bones_values(keypoints, bones_idxs)
 
-		bones_values = [[] for _ in range(len(bones_defs))]
-		time = 0
-		duration = 0
+	def read_keypoints(self, poses_folder, person_idx=0, openpose_process=None):
+		"""
+		Reads the keypoints of a person from the .json files outputted by OpenPose.
+
+		:param poses_folder: Folder which contains the .json files.
+		:param person_idx: Index of the person to read. By default is 0, the first person.
+		:param openpose_process: OpenPose process which is writing the .json files. By default is None, all the files are already written.
+		:return: Array of shape (frames, keypoints, 3) with the x, y and confidence of every keypoint in BODY_25 format.
+			The frames without the person are filled with NaN.
+		"""
+		# Use the cached keypoints if OpenPose has not been executed again
+		cache_path = self.get_keypoints_cache_path(poses_folder, person_idx) if self.use_cache else None
+		if cache_path is not None and openpose_process is None and os.path.exists(cache_path):
+			with np.load(cache_path) as cache:
+				return cache["keypoints"]
+
+		# If all the files are already written, they can be parsed in parallel
+		if self.num_processes != 1 and openpose_process is None:
+			keypoints = self.read_keypoints_parallel(poses_folder, person_idx)
+			if cache_path is not None:
+				np.savez_compressed(cache_path, keypoints=keypoints)
+			return keypoints
+
+		# The keypoints are written frame by frame in a buffer which doubles its size when full,
+		# so only its values are held in memory instead of a Python list per frame
+		# It is kept in double precision, as the parsed values, so the angles don't depend on rounding them
+		keypoints = np.full((self.KEYPOINTS_BUFFER_INITIAL_FRAMES, self.NUM_BODY_KEYPOINTS * 3), np.nan)
 		num_frames = 0
-		first_correct_frame = -1
-
-		# Read bones values
-		file_names = os.listdir(poses_folder)
-		for file_name in file_names:
-			if file_name.endswith(".json"):
-				file_path = os.path.join(poses_folder, file_name)
-				with open(file_path) as frame_file:
-					frame_dict = json_load(frame_file)
-					time = (num_frames - max(0, first_correct_frame)) * self.time_per_frame
-					contains_data = self.get_bones_values(frame_dict, time, bones_defs, bones_values, person_idx)
-					if contains_data:
-						if first_correct_frame == -1:
-							first_correct_frame = num_frames
-						else:
-							duration = time
-					num_frames += 1
+		previous_content = None
+
+		# The contents are closed on any error, so the reading thread stops before the poses folder may be removed
+		with closing(self.iter_poses_contents(poses_folder, openpose_process)) as contents:
+			for content in contents:
+				# A file identical to the previous one (such as consecutive frames without people) isn't parsed again
+				if content != previous_content:
+					people = json_loads(content)["people"]
+					previous_content = content
+
+				if num_frames == len(keypoints):
+					keypoints = np.concatenate((keypoints, np.full_like(keypoints, np.nan)))
+
+				# The frames without the person keep the NaN values
+				if len(people) > person_idx:
+					keypoints[num_frames] = people[person_idx]["pose_keypoints_2d"]
+				num_frames += 1
+
+		keypoints = keypoints[:num_frames].reshape(-1, self.NUM_BODY_KEYPOINTS, 3)
+		if cache_path is not None:
+			np.savez_compressed(cache_path, keypoints=keypoints)
+
+		return keypoints
+
+	def read_keypoints_parallel(self, poses_folder, person_idx=0):
+		"""
+		Reads the keypoints of a person as read_keypoints, but parsing the .json files in num_processes processes.
+		All the files must be already written.
+
+		:param poses_folder: Folder which contains the .json files.
+		:param person_idx: Index of the person to read. By default is 0, the first person.
+		:return: Array of shape (frames, keypoints, 3), as returned by read_keypoints.
+		"""
+		files_paths = list(self.iter_poses_files(poses_folder))
+		keypoints = np.full((len(files_paths), self.NUM_BODY_KEYPOINTS * 3), np.nan)
+
+		# The files are sent to the processes in chunks, so every process reads and parses many files for each message
+		with ProcessPoolExecutor(self.num_processes or None) as executor:
+			frames_keypoints = executor.map(self.read_pose_file, files_paths, repeat(person_idx),
+			                                chunksize=self.POSES_PARSE_CHUNK_SIZE)
+			for frame_idx, frame_keypoints in enumerate(frames_keypoints):
+				# The frames without the person keep the NaN values
+				if frame_keypoints is not None:
+					keypoints[frame_idx] = frame_keypoints
+
+		return keypoints.reshape(-1, self.NUM_BODY_KEYPOINTS, 3)
+
+	def read_pose_file(self, file_path, person_idx=0):
+		"""
+		Reads the keypoints of a person from a single .json file outputted by OpenPose.
+
+		:param file_path: Path of the .json file.
+		:param person_idx: Index of the person to read. By default is 0, the first person.
+		:return: List with the x, y and confidence of every keypoint, or None if the person isn't in the file.
+		"""
+		with open(file_path, "rb") as frame_file:
+			people = json_loads(frame_file.read())["people"]
+
+		return people[person_idx]["pose_keypoints_2d"] if len(people) > person_idx else None
+
+	def get_keypoints_cache_path(self, poses_folder, person_idx=0):
+		"""
+		Gets the path of the .npz file which caches the keypoints of a person read from poses_folder.
+		The name depends on the video path and modification time, so the keypoints of a modified video are not reused.
+
+		:param poses_folder: Folder which contains the .json files.
+		:param person_idx: Index of the person. By default is 0, the first person.
+		:return: Path of the cache file, placed next to poses_folder.
+		"""
+		video_id = f"{os.path.abspath(self.video_path)}{os.path.getmtime(self.video_path)}"
+		video_hash = hashlib.sha1(video_id.encode()).hexdigest()
+		return os.path.join(os.path.dirname(poses_folder), f"Keypoints_{video_hash}_{person_idx}.npz")
+
+	def iter_poses_contents(self, poses_folder, openpose_process=None):
+		"""
+		Iterates the content of the .json files of poses_folder in frame order, as returned by iter_poses_files.
+		The files are read in a background thread, up to POSES_PREFETCH_SIZE files ahead,
+		so reading the next files overlaps with the processing of the current one.
+
+		:param poses_folder: Folder which contains (or will contain) the .json files.
+		:param openpose_process: OpenPose process which is writing the .json files. By default is None, all the files are already written.
+
+		:raises Exception: If OpenPose finishes with an error.
+
+		:return: Generator of the .json files contents, as bytes.
+		"""
+		contents = Queue(self.POSES_PREFETCH_SIZE)
+		stop = Event()
+
+		# Waits until there is space in the queue, unless the contents stop being consumed. Returns if it was put
+		def put(item):
+			while not stop.is_set():
+				try:
+					contents.put(item, timeout=self.POSES_PREFETCH_TIMEOUT)
+					return True
+				except Full:
+					pass
+			return False
+
+		# Every content is put in the queue, followed by None when finished or the exception raised
+		def read_files():
+			try:
+				for file_path in self.iter_poses_files(poses_folder, openpose_process):
+					# The file is closed before waiting to put it, so it isn't kept open if the contents stop being consumed
+					if stop.is_set():
+						return
+					with open(file_path, "rb") as frame_file:
+						content = frame_file.read()
+					if not put(content):
+						return
+				put(None)
+			except Exception as exception:
+				put(exception)
+
+		# As a daemon, the thread doesn't keep the program alive if it is waiting for OpenPose
+		Thread(target=read_files, daemon=True).start()
+
+		# If the consumer stops early (for example, by an exception), the thread is stopped too
+		try:
+			while True:
+				content = contents.get()
+				if content is None:
+					return
+				if isinstance(content, Exception):
+					raise content
+				yield content
+		finally:
+			stop.set()
+
+	def iter_poses_files(self, poses_folder, openpose_process=None):
+		"""
+		Iterates the .json files of poses_folder in frame order.
+		If OpenPose is running, waits for the files it writes, so the poses can be read while the video is processed.
+		To avoid reading a file while it is being written, the last file is only returned when OpenPose has finished.
+
+		:param poses_folder: Folder which contains (or will contain) the .json files.
+		:param openpose_process: OpenPose process which is writing the .json files. By default is None, all the files are already written.
+
+		:raises Exception: If OpenPose finishes with an error.
+
+		:return: Generator of the .json files paths.
+		"""
+		# While OpenPose is running, the folder is only listed until its first file is written
+		# Then, as OpenPose names the files by frame index, the next frame file is searched directly
+		# A file is complete when the file of the next frame exists
+		frame_path_format = None
+		frame_idx = 0
+		last_path = ""
+		while openpose_process is not None and openpose_process.poll() is None:
+			if frame_path_format is None:
+				files_paths = self.list_poses_files(poses_folder)
+				if len(files_paths) > 0:
+					name, first_frame_idx, suffix = os.path.basename(files_paths[0]).rsplit("_", 2)
+					frame_path_format = os.path.join(poses_folder, f"{name}_{{:012d}}_{suffix}")
+					frame_idx = int(first_frame_idx)
+
+			if frame_path_format is not None and os.path.exists(frame_path_format.format(frame_idx + 1)):
+				last_path = frame_path_format.format(frame_idx)
+				yield last_path
+				frame_idx += 1
+			else:
+				time.sleep(self.OPENPOSE_POLL_INTERVAL)
+
+		# When OpenPose has finished (or it wasn't running), all the remaining files are complete
+		yield from (file_path for file_path in self.list_poses_files(poses_folder) if file_path > last_path)
+
+		if openpose_process is not None and openpose_process.returncode != 0:
+			raise Exception(f"Problem executing OpenPose: exit code {openpose_process.returncode}")
+
+	def list_poses_files(self, poses_folder):
+		"""
+		Lists the .json files of poses_folder in frame order.
+
+		:param poses_folder: Folder which contains the .json files. If it doesn't exist, there are no files.
+		:return: Sorted list of the .json files paths.
+		"""
+		if not os.path.isdir(poses_folder):
+			return []
+		with os.scandir(poses_folder) as entries:
+			return sorted(entry.path for entry in entries if entry.name.endswith(".json"))
+
+	def get_bones_values(self, keypoints, bones_idxs):
+		"""
+		Gets the bones angles of all the frames at once.
+		A bone angle is only obtained if the confidence of its keypoints is enough and, if it has a parent, the parent
+		angle is obtained in the same frame. In that case, it decreases the parent angle of the obtained one.
+
+		:param keypoints: Array of keypoints returned by read_keypoints.
+		:param bones_idxs: Indices of the bones definitions to use, obtained with get_bones_idxs.
+		:return: A list where every position belongs to a bone and the duration of the animation.
+			Each bone has an array of shape (keys, 2) where every row is a keypoint (pair of timestamp and angle).
+		"""
+		bones_values = [np.empty((0, 2)) for _ in range(len(bones_idxs))]
+
+		# Timestamps, starting at the first frame which contains the person
+		frames_with_person = np.flatnonzero(~np.isnan(keypoints[:, 0, 2]))
+		if len(frames_with_person) == 0:
+			return bones_values, 0
+		times = (np.arange(len(keypoints)) - frames_with_person[0]) * self.time_per_frame
+		duration = float(times[frames_with_person[-1]])
+
+		# Discard the keypoints without enough confidence. NaN propagates, so the angles of its bones will be NaN
+		# The arrays are keypoint-major and bone-major, so the values of a bone in all frames are contiguous
+		positions = keypoints[:, :, :2].transpose(1, 0, 2).astype(np.float64)
+		positions[:, :, 1] = 1 - positions[:, :, 1]
+		positions[keypoints[:, :, 2].T < self.min_confidence] = np.nan
+
+		# Angles of all bones in all frames
+		ini_idxs = bones_idxs[:, self.BONE_IDXS_INI]
+		end_idxs = bones_idxs[:, self.BONE_IDXS_END]
+		parents_idxs = bones_idxs[:, self.BONE_IDXS_PARENT]
+		offsets = positions[end_idxs].mean(axis=1) - positions[ini_idxs].mean(axis=1)
+		angles = np.degrees(np.arctan2(offsets[:, :, 1], offsets[:, :, 0])) - self.body_orientation
+
+		# Relative angles and continuity between frames (parents are always before its children)
+		for bone_idx, parent_idx in enumerate(parents_idxs):
+			bone_angles = angles[bone_idx]
+			if parent_idx != -1:
+				bone_angles -= angles[parent_idx]  # NaN if the parent is missing
+
+			bone_valid = ~np.isnan(bone_angles)
+			valid_angles = bone_angles[bone_valid] % 360
+
+			# Use the more similar angle to the previous, adding or subtracting complete turns
+			turns = np.round(np.diff(valid_angles) / 360)
+			valid_angles[1:] -= 360 * np.cumsum(turns)
+
+			bone_angles[bone_valid] = valid_angles
+			bones_values[bone_idx] = np.column_stack((times[bone_valid], valid_angles))
 
 		return bones_values, duration
 
-	def get_bones_values(self, frame_dict, time, bones_defs, bones_values, person_idx=0):
+	def get_bones_idxs(self, bones_defs):
 		"""
-		Gets the bones angles of a frame and a person.
-		If a bone has a parent, it decreases the parent angle of the obtained one.
+		Gets the indices of the bones definitions as a single array, to use them with all the bones at once.
+		Every row has the initial keypoints (2 columns), end keypoints (2 columns) and parent of a bone.
+		A keypoint index which is not an integer is represented by the current keypoint and next one, to average them.
+		Otherwise, the keypoint index is repeated.
+		The columns of each value can be selected with the BONE_IDXS_INI, BONE_IDXS_END and BONE_IDXS_PARENT constants.
 
-		:param frame_dict: Dictionary extracted from the .json file of a frame.
-		:param time: Timestamp of the frame.
 		:param bones_defs: Bones definitions to use.
-		:param bones_values: Current list of bones values. The new values will be appended to it.
-		:param person_idx: Index of the person to create the animation. By default is 0, the first person.
-		:return: If the frame contains at least one keypoint.
-		"""
-		contains_data = False
-
-		people = frame_dict["people"]
-		if len(people) > person_idx:
-			keypoints = people[person_idx]["pose_keypoints_2d"]
-			for i, bone_def in enumerate(bones_defs):
-				# Manage parent value
-				parent_idx = bone_def[2]
-				needs_parent = parent_idx != -1
-				has_parent = False
-				parent_values = None
-				if needs_parent:
-					parent_bone = bones_values[parent_idx]
-					has_parent = len(parent_bone) > 0
-					if has_parent:
-						parent_values = parent_bone[-1]
-						has_parent = parent_values[0] == time  # Last frame is the current
-
-				is_correct = has_parent or not needs_parent
-				if is_correct:
-					ini = self.get_kp(keypoints, bone_def[0])
-					end = self.get_kp(keypoints, bone_def[1])
-
-					if ini and end:
-						offset = self.kp_sub(end, ini)
-						angle = atan2(offset[1], offset[0])
-						angle = degrees(angle) - self.body_orientation
-						if has_parent:
-							angle -= parent_values[1]
-						angle = angle % 360
-
-						# Use the more similar angle to the previous
-						if len(bones_values[i]) > 0:
-							previous_angle = bones_values[i][-1][1]
-							possible_angles = [angle + 360, angle - 360]
-							min_diff = abs(angle - previous_angle)
-							for possible_angle in possible_angles:
-								diff = abs(possible_angle - previous_angle)
-								if diff < min_diff:
-									min_diff = diff
-									angle = possible_angle
-
-						bones_values[i].append([time, angle])
-
-				if is_correct and not contains_data:
-					contains_data = True
-
-		return contains_data
-
-	def get_kp(self, keypoints, idx):
-		"""
-		Gets a keypoint of the array only if is confidence is greater or equal to the minimum required.
-		Exceptionally, if the index is not an integer, gets the average of the current keypoint and next one.
-
-		:param keypoints: Array of keypoints of a frame.
-		:param idx: Index of the keypoint in BODY_25 format.
-		:return: The keypoint of the index or, if the confidence isn't enough, None.
-		"""
-		kp = None
-
-		if idx % 1 == 0:
-			ini = idx * 3
-			val = keypoints[ini: ini + 3]
-
-			if val[2] >= self.min_confidence:
-				kp = val
-				kp[1] = 1 - kp[1]
-		else:
-			a = self.get_kp(keypoints, int(idx))
-			b = self.get_kp(keypoints, int(idx + 1))
-			if a and b:
-				kp = self.kp_average(a, b)
-
-		return kp
-
-	def kp_average(self, a, b):
-		"""
-		Computes the average of two keypoints time and angle.
-		:param a: First keypoint.
-		:param b: Second keypoint.
-		:return: A keypoint with the average time and angle of both.
-		"""
-		return [(a[0] + b[0]) / 2, (a[1] + b[1]) / 2]
-
-	def kp_sub(self, a, b):
-		"""
-		Computes the difference between two keypoints time and angle.
-		:param a: First keypoint.
-		:param b: Second keypoint.
-		:return: A keypoint with the difference of time and angle.
-		"""
-		return [a[0] - b[0], a[1] - b[1]]
+		:return: Array of shape (bones, 5) with the indices.
+		"""
+		bones_idxs = np.empty((len(bones_defs), 5), dtype=np.intp)
+		for bone_idx, (ini, end, parent_idx, *_) in enumerate(bones_defs):
+			bones_idxs[bone_idx] = (int(ini), int(ini) + (ini % 1 != 0), int(end), int(end) + (end % 1 != 0), parent_idx)
+
+		return bones_idxs
 
 	########### Post-process animation ###########
 	def process_animation(self, bones_values):
 		"""
 		Process the poses keypoints to smooth the animation.
-		In order to smooth it uses multi_line_fitting, reduce_trembling and check_avg_keys_per_sec methods.
+		In order to smooth it uses smooth_angles, one_euro_filter or reduce_trembling, multi_line_fitting or visvalingam_whyatt
+		and check_avg_keys_per_sec methods.
 		The methods used depends on the current settings.
 		Finally, computes the slope of each keypoint.
+		The bones are processed in parallel if num_processes is not 1.
 		See the README.md for more information.
 
-		:param bones_values: A list of lists where every position belongs to a bone.
-			Each bone has a list where every element is a keypoint (pair of timestamp and angle).
-		:return: A list of lists where every position belongs to a bone.
-			Each bone has a list where every element is a keypoint (timestamp, angle and slope).
-		"""
-		num_execs = 0
-		num_keys = 0
-		for bone_idx in range(len(bones_values)):
-			bone_keys = bones_values[bone_idx]
-			num_bone_keys = len(bone_keys)
-			if num_bone_keys != 0:
-				# Remove high frequency trembling
-				if self.min_trembling_freq > 0:
-					bones_values[bone_idx] = bone_keys = self.reduce_trembling(bone_keys)
-
-				# Fit the line to reduce redundancy and noise
-				if self.mlf_max_error_ratio > 0:
-					num_execs += 1
-					num_keys += len(bone_keys)
-					bones_values[bone_idx] = bone_keys = self.multi_line_fitting(bone_keys)
-
-				# Compute averages if is needed
-				if self.avg_keys_per_sec > 0:
-					bones_values[bone_idx] = bone_keys = self.check_avg_keys_per_sec(bone_keys)
-
-				# Compute slopes
-				for key_idx, key in enumerate(bone_keys):
-					slope = self.compute_slope(bone_keys, key_idx)
-					key.append(slope)
+		:param bones_values: A list where every position belongs to a bone.
+			Each bone has an array (or list) where every row is a keypoint (pair of timestamp and angle).
+		:return: A list where every position belongs to a bone.
+			Each bone has an array of shape (keys, 3) where every row is a keypoint (timestamp, angle and slope).
+		"""
+		if self.num_processes == 1:
+			return [self.process_bone(bone_keys) for bone_keys in bones_values]
 
-		return bones_values
+		# The bones are independent, so they can be processed in parallel
+		with ProcessPoolExecutor(self.num_processes or None) as executor:
+			return list(executor.map(self.process_bone, bones_values))
+
+	def process_bone(self, bone_keys):
+		"""
+		Process the keypoints of a bone as described in process_animation.
+
+		:param bone_keys: Keypoints of a bone (pairs of timestamp and angle).
+		:return: Array of keypoints of the bone with timestamp, angle and slope.
+		"""
+		bone_keys = np.asarray(bone_keys, dtype=np.float64).reshape(-1, 2)
+		if len(bone_keys) != 0:
+			# Smooth the angles
+			if self.smoothing_alpha > 0:
+				bone_keys = self.smooth_angles(bone_keys)
+
+			# Remove high frequency trembling
+			if self.one_euro_min_cutoff > 0:
+				bone_keys = self.one_euro_filter(bone_keys)
+			elif self.min_trembling_freq > 0:
+				bone_keys = self.reduce_trembling(bone_keys)
+
+			# Fit the line to reduce redundancy and noise
+			if self.mlf_max_error_ratio > 0:
+				if self.use_visvalingam:
+					bone_keys = self.visvalingam_whyatt(bone_keys)
+				else:
+					bone_keys = self.multi_line_fitting(bone_keys)
+
+			# Compute averages if is needed
+			if self.avg_keys_per_sec > 0:
+				bone_keys = self.check_avg_keys_per_sec(bone_keys)
+
+		# Compute slopes
+		return np.column_stack((bone_keys, self.compute_slopes(bone_keys)))
+
+	def smooth_angles(self, bone_keys):
+		"""
+		Smooths the angles of a bone with an exponential moving average.
+		Every angle is replaced by its linear interpolation with the previous smoothed angle, using smoothing_alpha as weight.
+		Because the bones only rotate around the z-axis and consecutive angles are continuous (not wrapped to 360),
+		this is equivalent to a spherical linear interpolation (SLERP) of the rotations, without using quaternions.
+		See the README.md for more information.
+
+		:param bone_keys: Array of keypoints of a bone.
+		:return: Array of keypoints of a bone with the angles smoothed.
+		"""
+		# Every value depends on the previous smoothed one, so iterate Python floats instead of NumPy scalars
+		values = bone_keys[:, 1].tolist()
+		smoothing_alpha = self.smoothing_alpha
+		for key_idx in range(1, len(values)):
+			values[key_idx] += smoothing_alpha * (values[key_idx - 1] - values[key_idx])
+
+		smoothed_bone_keys = bone_keys.copy()
+		smoothed_bone_keys[:, 1] = values
+
+		return smoothed_bone_keys
+
+	def one_euro_filter(self, bone_keys):
+		"""
+		Filters the angles of a bone with the One Euro filter: a low-pass filter whose cutoff frequency increases with the speed.
+		So, the slow movements are strongly smoothed (removing the trembling) and the fast ones are barely delayed.
+		See the README.md for more information.
+
+		:param bone_keys: Array of keypoints of a bone.
+		:return: Array of keypoints of a bone with the angles filtered.
+		"""
+		# The derivative is smoothed by a low-pass filter with a fixed cutoff frequency, so its smoothing factors are precomputed
+		time_deltas = np.diff(bone_keys[:, 0])
+		derivative_alphas = (1 / (1 + 1 / (2 * np.pi * self.ONE_EURO_DERIVATIVE_CUTOFF * time_deltas))).tolist()
+		time_deltas = time_deltas.tolist()
+
+		# Every value depends on the previous filtered one, so iterate Python floats instead of NumPy scalars
+		values = bone_keys[:, 1].tolist()
+		min_cutoff = self.one_euro_min_cutoff
+		beta = self.one_euro_beta
+		derivative = 0
+		for key_idx in range(1, len(values)):
+			time_delta = time_deltas[key_idx - 1]
+			derivative += derivative_alphas[key_idx - 1] * ((values[key_idx] - values[key_idx - 1]) / time_delta - derivative)
+
+			# The cutoff frequency increases with the speed
+			cutoff = min_cutoff + beta * abs(derivative)
+			alpha = 1 / (1 + 1 / (2 * math.pi * cutoff * time_delta))
+			values[key_idx] = values[key_idx - 1] + alpha * (values[key_idx] - values[key_idx - 1])
+
+		filtered_bone_keys = bone_keys.copy()
+		filtered_bone_keys[:, 1] = values
+
+		return filtered_bone_keys
 
 	def reduce_trembling(self, bone_keys):
 		"""
 		Removes the keypoints that makes consecutive ups and downs at high frequency (greater or equal to min_trembling_freq).
 		See the README.md for more information.
 
-		:param bone_keys: Keypoints of a bone.
-		:return: Keypoints of a bone with trembling reduced.
+		:param bone_keys: Array of keypoints of a bone.
+		:return: Array of keypoints of a bone with trembling reduced.
 		"""
 
-		num_bone_keys = len(bone_keys)
-		new_bone_keys = [bone_keys[0]]
-
-		key_idx = 1
-		previous_kp = bone_keys[0]
-		keypoint = bone_keys[key_idx]
-		ini_wave_idx = -1
-		while key_idx < num_bone_keys - 1:
-			next_kp = bone_keys[key_idx + 1]
-			has_wave_period = (next_kp[0] - previous_kp[
-				0]) <= self.max_trembling_period  # Time smaller than the maximum trembling period
-			has_wave_values = (keypoint[1] - previous_kp[1] > 0) != (
-					next_kp[1] - keypoint[1] > 0)  # It's a wave if the slope changes
-			is_trembling_wave = has_wave_period and has_wave_values
-			if is_trembling_wave:
-				# If is the start of a trembling wave
-				if ini_wave_idx == -1:
-					ini_wave_idx = key_idx
-			else:
-				# If is end of the wave, ignore the trembling
-				if ini_wave_idx != -1:
-					ini_wave_idx = -1
-
-				# Always add if it don't belongs to a trembling wave
-				new_bone_keys.append(keypoint)
+		if len(bone_keys) < 3:
+			return bone_keys
+		times = bone_keys[:, 0]
+		values = bone_keys[:, 1]
 
-			# Advance to next
-			previous_kp = keypoint
-			keypoint = next_kp
-			key_idx += 1
+		# A keypoint belongs to a trembling wave if the slope changes around it (peak or valley)
+		# in a time smaller than the maximum trembling period
+		is_rising = np.diff(values) > 0
+		has_wave_values = is_rising[:-1] != is_rising[1:]
+		has_wave_period = (times[2:] - times[:-2]) <= self.max_trembling_period
 
-		# Always add last keypoint
-		new_bone_keys.append(bone_keys[-1])
+		# Always keep the first and last keypoints
+		keep = np.ones(len(bone_keys), dtype=bool)
+		keep[1:-1] = ~(has_wave_values & has_wave_period)
 
-		return new_bone_keys
+		return bone_keys[keep]
 
 	def multi_line_fitting(self, bone_keys):
 		"""
 		Applies the Multi-Line Fitting algorithm (implemented in the MultiLineFitting class) to bone_keys.
 		An explanation of MLF can be found in the README.md.
 
-		:param bone_keys: A list which contains the keypoints (pair of timestamp and angle) of a bone.
-		:return: The new bone keys list processed by the MLF algorithm.
+		:param bone_keys: An array which contains the keypoints (pair of timestamp and angle) of a bone.
+		:return: The new bone keys array processed by the MLF algorithm.
 		"""
-		# Perform MultiLineFitting
-		estimated_keypoints_arr = MultiLineFitting(self.mlf_max_error_ratio)(bone_keys)
+		return MultiLineFitting(self.mlf_max_error_ratio)(bone_keys)
 
-		# Transform to list of lists
-		estimated_keypoints = [list(x) for x in estimated_keypoints_arr]	
+	def visvalingam_whyatt(self, bone_keys):
+		"""
+		Applies the Visvalingam-Whyatt algorithm (implemented in the VisvalingamWhyatt class) to bone_keys.
+		An explanation can be found in the README.md.
 
-		return estimated_keypoints
+		:param bone_keys: An array which contains the keypoints (pair of timestamp and angle) of a bone.
+		:return: The new bone keys array processed by the Visvalingam-Whyatt algorithm.
+		"""
+		return VisvalingamWhyatt(self.mlf_max_error_ratio)(bone_keys)
 
 	def check_avg_keys_per_sec(self, bone_keys):
 		"""
@@ -683,98 +1122,58 @@ $CURVE      m_PreInfinity: 2
 		Then, computes the averages of some keypoints to reduce the amount to the defined one.
 		See the README.md for more information.
 
-		:param bone_keys: Keypoints list of a bone.
+		:param bone_keys: Keypoints array of a bone.
 		:return: Processed bone_keys with the corresponding averages.
 		"""
 		num_bone_keys = len(bone_keys)
-		ini_second_time = bone_keys[1][0]
+		if num_bone_keys < 4:
+			return bone_keys
+		times = bone_keys[:, 0].tolist()
+
+		# Indices where every group of keys to average starts. The first and last keys are never averaged
+		groups_starts = [0]
 		ini_second_key_idx = 1
-		key_idx = 2
-		new_keypoint_idx = 1
 
-		while key_idx < num_bone_keys - 1:
-			time = bone_keys[key_idx][0]
-			elapsed_time = time - ini_second_time
+		for key_idx in range(2, num_bone_keys - 1):
+			elapsed_time = times[key_idx] - times[ini_second_key_idx]
 			is_penultimate = key_idx == (num_bone_keys - 2)
 
-			if is_penultimate:
-				key_idx += 1  # Needed to include it in averages computation
-
 			# If a second passed
 			if elapsed_time > 1 or is_penultimate:
-				keys_count = key_idx - ini_second_key_idx
-				# If the key count is less than or equal to the desired
+				end_second_key_idx = key_idx + 1 if is_penultimate else key_idx  # Include the penultimate in the averages
+				keys_count = end_second_key_idx - ini_second_key_idx
+				# If the key count is less than or equal to the desired, don't modify these keys
 				if keys_count <= self.avg_keys_per_sec:
-					new_keypoint_idx += keys_count  # Don't modify these keys
-				# If the key count is grater than the desired
+					groups_starts.extend(range(ini_second_key_idx, end_second_key_idx))
+				# If the key count is grater than the desired, split them in groups (the last one also has the remainder)
 				else:
 					num_keys_to_avg = keys_count // self.avg_keys_per_sec
-					ini = ini_second_key_idx
-					end = ini + num_keys_to_avg
-					# Compute the averages
-					for i in range(0, self.avg_keys_per_sec - 1):
-						keys_for_average = bone_keys[ini:end]
-						bone_keys[new_keypoint_idx] = self.bone_keys_average(keys_for_average)
-						new_keypoint_idx += 1
-						ini = end
-						end = ini + num_keys_to_avg
-
-					# Add the last average
-					keys_for_average = bone_keys[ini:key_idx]
-					bone_keys[new_keypoint_idx] = self.bone_keys_average(keys_for_average)
-					new_keypoint_idx += 1
-
-				ini_second_time = time
-				ini_second_key_idx = key_idx
+					groups_end = ini_second_key_idx + self.avg_keys_per_sec * num_keys_to_avg
+					groups_starts.extend(range(ini_second_key_idx, groups_end, num_keys_to_avg))
 
-			key_idx += 1
-
-		# Add the last keypoint
-		bone_keys[new_keypoint_idx] = bone_keys[-1]
-		new_keypoint_idx += 1
-
-		return bone_keys[:new_keypoint_idx]
-
-	def bone_keys_average(self, bone_keys):
-		"""
-		Computes the time and angle average of a list of keypoints.
-
-		:param bone_keys: List of keypoints to average.
-		:return: A unique keypoint with the time and angle average.
-		"""
-
-		average = [0, 0]
-
-		# Sum values
-		for time, value in bone_keys:
-			average[0] = average[0] + time
-			average[1] = average[1] + value
+				ini_second_key_idx = key_idx
 
-		# Compute averages
-		num_values = float(len(bone_keys))
-		average[0] /= num_values
-		average[1] /= num_values
+		groups_starts.append(num_bone_keys - 1)
 
-		return average
+		# Compute the averages of all groups at once
+		groups_sizes = np.diff(groups_starts + [num_bone_keys])
+		return np.add.reduceat(bone_keys, groups_starts, axis=0) / groups_sizes[:, np.newaxis]
 
-	def compute_slope(self, bone_keys, key_idx):
+	def compute_slopes(self, bone_keys):
 		"""
-		Computes the slope of a keypoint using the previous and next keypoints.
-		If is the first or last keypoint the slope will be zero.
+		Computes the slope of every keypoint using the previous and next keypoints.
+		The slope of the first and last keypoints will be zero.
 
-		:param bone_keys: List of bone keypoints.
-		:param key_idx: Index of the keypoint to compute the slope.
-		:return: The corresponding slope.
+		:param bone_keys: Array of bone keypoints.
+		:return: Array with the corresponding slopes.
 		"""
 
-		slope = 0
+		slopes = np.zeros(len(bone_keys))
+		times = bone_keys[:, 0]
+		values = bone_keys[:, 1]
+		slopes[1:-1] = (values[2:] - values[:-2]) / (times[2:] - times[:-2])
 
-		if key_idx != 0 and key_idx != len(bone_keys) - 1:
-			previous_kp = bone_keys[key_idx - 1]
-			next_kp = bone_keys[key_idx + 1]
-			slope = (next_kp[1] - previous_kp[1]) / (next_kp[0] - previous_kp[0])
-
-		return slope
+		return slopes
 
 	########### Write animation ###########
 	def write_anim(self, bones_values, bones_defs, duration, file_path):
@@ -784,58 +1183,60 @@ $CURVE      m_PreInfinity: 2
 	    The generated file is in YAML format, and defines the animation as euler_curves and editor_curves (both with the same data).
 	    The only modified attribute of the bones is the rotation of the z-axis, because it is a 2D animation.
 
-		:param bones_values: List of bones keypoints with timestamp, angle and slope.
+		:param bones_values: List of bones keypoints arrays with timestamp, angle and slope.
 		:param bones_defs: Bones definitions that contains the path of each bone.
 		:param duration: Total duration in seconds of the animation.
 		:param file_path: Path of the file to write. If the file exists, it will be overwritten.
 		"""
 
 		# Prepare templates
-		euler_curve_tmpl = Template(self.EULER_CURVE_TEMPLATE)
-		euler_curves_str = ''
-		euler_keys_tmpl = Template(self.EULER_CURVE_KEY_TEMPLATE)
-		euler_keys_str = ''
-		editor_curve_tmpl = Template(self.EDITOR_CURVE_TEMPLATE)
-		editor_curves_str = ''
-		editor_keys_tmpl = Template(self.EDITOR_CURVE_KEY_TEMPLATE)
-		editor_keys_str = ''
-		curve_tmpl_values = {'CURVE': '', 'PATH': '', 'ATTR': 'localEulerAnglesRaw.z'}
-		key_tmpl_values = {'TIME': 0, 'VALUE': 0, 'SLOPE': 0}
-
-		# Process all bone values
-		for bone_idx, bone_values in enumerate(bones_values):
-			if len(bone_values):
-				for time, value, slope in bone_values:
-					key_tmpl_values['TIME'] = '%.2f' % time
-					key_tmpl_values['VALUE'] = '{x: 0, y: 0, z: ' + value.__str__() + '}'
-					key_tmpl_values['SLOPE'] = '{x: 0, y: 0, z: ' + slope.__str__() + '}'
-					euler_keys_str += euler_keys_tmpl.substitute(key_tmpl_values)
-					key_tmpl_values['VALUE'] = value
-					key_tmpl_values['SLOPE'] = slope
-					editor_keys_str += editor_keys_tmpl.substitute(key_tmpl_values)
-
-				curve_tmpl_values['PATH'] = bones_defs[bone_idx][3]
-				curve_tmpl_values['CURVE'] = euler_keys_str
-				euler_curves_str += euler_curve_tmpl.substitute(curve_tmpl_values)
-				curve_tmpl_values['CURVE'] = editor_keys_str
-				editor_curves_str += editor_curve_tmpl.substitute(curve_tmpl_values)
-				euler_keys_str = ''
-				editor_curves_str = ''
-
-		# Substitue file regions
-		file_tmpl = Template(self.ANIM_FILE_TEMPLATE)
+		euler_curve_tmpl = self.EULER_CURVE_TMPL
+		euler_key_fmt = self.EULER_CURVE_KEY_FORMAT
+		editor_curve_tmpl = self.EDITOR_CURVE_TMPL
+		editor_curves = []
+		editor_key_fmt = self.EDITOR_CURVE_KEY_FORMAT
+		curve_tmpl_values = {'PATH': '', 'ATTR': 'localEulerAnglesRaw.z'}
+
+		# The file and curves templates are split in the regions to fill, which are written between its parts
+		# So the whole file content is never held in memory
 		anim_name = os.path.splitext(os.path.basename(file_path))[0]
-		tmpl_values = {'NAME': anim_name,
-		               'EULER_CURVES': euler_curves_str,
-		               'DURATION': duration,
-		               'EDITOR_CURVES': editor_curves_str,
-		               'ATTR': 'localEulerAnglesRaw.z'}
-		file_content = file_tmpl.substitute(tmpl_values)
+		file_tmpl_values = {'NAME': anim_name, 'DURATION': duration}
+		file_head, file_tail = self.ANIM_FILE_TMPL.safe_substitute(file_tmpl_values).split('$EULER_CURVES')
+		file_middle, file_tail = file_tail.split('$EDITOR_CURVES')
 
 		# Write animation file
 		os.makedirs(os.path.dirname(file_path), exist_ok=True)
-		with open(file_path, "w") as out_file:
-			out_file.write(file_content)
+		with open(file_path, "w", buffering=self.ANIM_FILE_BUFFER_SIZE) as out_file:
+			out_file.write(file_head)
+
+			# Process all bone values. The Euler curves are written directly and the editor curves are kept until its region
+			for bone_idx, bone_values in enumerate(bones_values):
+				if len(bone_values):
+					euler_keys = []
+					editor_keys = []
+					# Every column is converted to text at once, so each number is only converted one time for both curves
+					times_strs = ['%.2f' % key_time for key_time in bone_values[:, 0].tolist()]
+					values_strs = list(map(repr, bone_values[:, 1].tolist()))
+					slopes_strs = list(map(repr, bone_values[:, 2].tolist()))
+					for key_time, value, slope in zip(times_strs, values_strs, slopes_strs):
+						key_values = (key_time, value, slope, slope)
+						euler_keys.append(euler_key_fmt % key_values)
+						editor_keys.append(editor_key_fmt % key_values)
+
+					curve_tmpl_values['PATH'] = bones_defs[bone_idx][3]
+					curve_head, curve_tail = euler_curve_tmpl.safe_substitute(curve_tmpl_values).split('$CURVE')
+					out_file.write(curve_head)
+					out_file.writelines(euler_keys)
+					out_file.write(curve_tail)
+					curve_head, curve_tail = editor_curve_tmpl.safe_substitute(curve_tmpl_values).split('$CURVE')
+					editor_curves.append((curve_head, editor_keys, curve_tail))
+
+			out_file.write(file_middle)
+			for curve_head, curve_keys, curve_tail in editor_curves:
+				out_file.write(curve_head)
+				out_file.writelines(curve_keys)
+				out_file.write(curve_tail)
+			out_file.write(file_tail)
 
 
 class MultiLineFitting():
@@ -843,65 +1244,37 @@ class MultiLineFitting():
 		self.max_error_ratio = max_error_ratio
 
 	def __call__(self, keypoints):
-		keypoints = np.array(keypoints)
+		keypoints = np.asarray(keypoints)
 		timestamps = keypoints[:, 0]
 		values = keypoints[:, 1]
-		max_error_thld = (values.max() - values.min()) * self.max_error_ratio
-
-		# Compute initial estimation and errors
-		estimation_idxs = [0, len(keypoints)-1]
-		values_estimation = np.empty_like(values)
-		self.estimate_line(keypoints[0], keypoints[-1], timestamps, values_estimation)
-		errors = values - values_estimation
-		errors = np.abs(errors, out=errors)
-		max_error_idx = errors.argmax()
-
-		# If some error is too high, perform fitting
-		if errors[max_error_idx] > max_error_thld:
-			top_errors_idxs = [max_error_idx]
-			heapq.heapify(top_errors_idxs)
-
-			# Iterative fitting			
-			while len(top_errors_idxs):
-				# Get maximum error
-				max_error_idx = heapq.heappop(top_errors_idxs)
-				error = errors[max_error_idx]
-
-				# If error is too high, adapt estimation
-				if error > max_error_thld:
-					max_error_est_idx = bisect(estimation_idxs, max_error_idx)
-					estimation_idxs.insert(max_error_est_idx, max_error_idx)
-					est_idx_left = estimation_idxs[max_error_est_idx-1]
-					est_idx_right = estimation_idxs[max_error_est_idx+1]
-
-					# New estimation line at left
-					self.estimate_line(keypoints[est_idx_left], keypoints[max_error_idx],
-						timestamps[est_idx_left:max_error_idx+1],
-						values_estimation[est_idx_left:max_error_idx+1])
-					
-					# New estimation line at right
-					self.estimate_line(keypoints[max_error_idx], keypoints[est_idx_right],
-						timestamps[max_error_idx:est_idx_right+1],
-						values_estimation[max_error_idx:est_idx_right+1])
-					
-					# Recompute errors
-					np.subtract(values[est_idx_left:est_idx_right+1], values_estimation[est_idx_left:est_idx_right+1], out=errors[est_idx_left:est_idx_right+1])
-					np.abs(errors[est_idx_left:est_idx_right+1], out=errors[est_idx_left:est_idx_right+1])
-
-					# Get maximum error at left and store it if too high
-					new_max_error_idx = errors[est_idx_left:max_error_idx].argmax()
-					new_max_error_idx += est_idx_left
-					if errors[new_max_error_idx] > max_error_thld:
-						heapq.heappush(top_errors_idxs, new_max_error_idx)
-					
-					# Get maximum error at right and store it if too high
-					new_max_error_idx = errors[max_error_idx:est_idx_right+1].argmax()
-					new_max_error_idx += max_error_idx
-					if errors[new_max_error_idx] > max_error_thld:
-						heapq.heappush(top_errors_idxs, new_max_error_idx)
-			
+		max_error_thld = np.ptp(values) * self.max_error_ratio
+
+		# Start with the initial and end keypoints, and split the segments with a too high error
+		# at its maximum error keypoint until all errors are tolerable
+		keep = np.zeros(len(keypoints), dtype=bool)
+		keep[0] = keep[-1] = True
+		segments = [(0, len(keypoints)-1)]
+		errors = np.empty_like(values)
+
+		while len(segments):
+			ini_idx, end_idx = segments.pop()
+			if end_idx - ini_idx > 1:
+				# Errors of the inner keypoints of the segment
+				segment_errors = errors[ini_idx+1:end_idx]
+				self.estimate_line(keypoints[ini_idx], keypoints[end_idx], timestamps[ini_idx+1:end_idx], segment_errors)
+				np.subtract(values[ini_idx+1:end_idx], segment_errors, out=segment_errors)
+				np.abs(segment_errors, out=segment_errors)
+
+				# If the maximum error is too high, split the segment
+				max_error_idx = segment_errors.argmax()
+				if segment_errors[max_error_idx] > max_error_thld:
+					max_error_idx += ini_idx + 1
+					keep[max_error_idx] = True
+					segments.append((ini_idx, max_error_idx))
+					segments.append((max_error_idx, end_idx))
+
 		# Gather keypoints for final estimation
-		estimated_keypoints = keypoints[estimation_idxs]
+		estimated_keypoints = keypoints[keep]
 
 		return estimated_keypoints
 
@@ -912,5 +1285,61 @@ class MultiLineFitting():
 		np.add(out, ini_keypoint[1], out=out)
 	
 
+class VisvalingamWhyatt():
+	def __init__(self, max_error_ratio) -> None:
+		self.max_error_ratio = max_error_ratio
+
+	def __call__(self, keypoints):
+		keypoints = np.asarray(keypoints)
+		num_keypoints = len(keypoints)
+		if num_keypoints < 3:
+			return keypoints
+		max_error_thld = np.ptp(keypoints[:, 1]) * self.max_error_ratio
+		timestamps = keypoints[:, 0].tolist()
+		values = keypoints[:, 1].tolist()
+
+		# Linked list of the remaining keypoints
+		previous_idxs = list(range(-1, num_keypoints - 1))
+		next_idxs = list(range(1, num_keypoints + 1))
+
+		# Min-heap of the inner keypoints by its error, with the outdated entries skipped when popped
+		errors = [0.0] * num_keypoints
+		for idx in range(1, num_keypoints - 1):
+			errors[idx] = self.estimate_error(timestamps, values, idx - 1, idx, idx + 1)
+		heap = [(errors[idx], idx) for idx in range(1, num_keypoints - 1)]
+		heapq.heapify(heap)
+
+		# Remove the keypoint with the minimum error until all errors are intolerable
+		estimate_error = self.estimate_error
+		keep = np.ones(num_keypoints, dtype=bool)
+		while len(heap):
+			error, idx = heapq.heappop(heap)
+			if not keep[idx] or error != errors[idx]:
+				continue
+			if error > max_error_thld:
+				break
+
+			keep[idx] = False
+			previous_idx = previous_idxs[idx]
+			next_idx = next_idxs[idx]
+			next_idxs[previous_idx] = next_idx
+			previous_idxs[next_idx] = previous_idx
+
+			# The neighbours errors are never lower than the removed one. Keeps the removal order monotonic, as in the original algorithm
+			for neighbour_idx in (previous_idx, next_idx):
+				if 0 < neighbour_idx < num_keypoints - 1:
+					neighbour_error = estimate_error(timestamps, values, previous_idxs[neighbour_idx],
+					                                 neighbour_idx, next_idxs[neighbour_idx])
+					errors[neighbour_idx] = max(neighbour_error, error)
+					heapq.heappush(heap, (errors[neighbour_idx], neighbour_idx))
+
+		return keypoints[keep]
+
+	def estimate_error(self, timestamps, values, previous_idx, idx, next_idx):
+		slope = (values[next_idx] - values[previous_idx]) / (timestamps[next_idx] - timestamps[previous_idx])
+		estimated_value = values[previous_idx] + slope * (timestamps[idx] - timestamps[previous_idx])
+		return abs(values[idx] - estimated_value)
+
+
 if __name__=="__main__":
 	raise Exception("Main not implemented")
\ No newline at end of file